@@ -1,48 +1,55 @@
 import numpy as np
 import scipy
 from sklearn.cluster import KMeans
+from sklearn.utils import check_random_state
+
+from ucsl.utils import count_co_occurrences
 
 
 def proportional_assign(l, d):
     """
     Proportional assignment based on margin
-    :param l: int
-    :param d: int
+    :param l: negative part of the margins min(d, 0), derived from d when None
+    :param d: margins shifted by -1
     :return:
     """
-    np.seterr(divide='ignore', invalid='ignore')
-    invL = np.divide(1, l)
-    idx = np.isinf(invL)
-    invL[idx] = d[idx]
-
-    for i in range(l.shape[0]):
-        pos = np.where(invL[i, :] > 0)[0]
-        neg = np.where(invL[i, :] < 0)[0]
-        if pos.size != 0:
-            invL[i, neg] = 0
-        else:
-            invL[i, :] = np.divide(invL[i, :], np.amin(invL[i, :]))
-            invL[i, invL[i, :] < 1] = 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # invert l in place instead of materializing l and 1 / l separately
+        invL = np.minimum(d, 0) if l is None else np.array(l, dtype=float)
+        np.divide(1, invL, out=invL)
+        idx = np.isinf(invL)
+        invL[idx] = d[idx]
+
+        for i in range(invL.shape[0]):
+            pos = np.where(invL[i, :] > 0)[0]
+            neg = np.where(invL[i, :] < 0)[0]
+            if pos.size != 0:
+                invL[i, neg] = 0
+            else:
+                invL[i, :] = np.divide(invL[i, :], np.amin(invL[i, :]))
+                invL[i, invL[i, :] < 1] = 0
 
-    S = np.multiply(invL, np.divide(1, np.sum(invL, axis=1))[:, np.newaxis])
+        S = np.multiply(invL, np.divide(1, np.sum(invL, axis=1))[:, np.newaxis])
 
     return S
 
 
-def sample_dpp(evalue, evector, k=None):
+def sample_dpp(evalue, evector, k=None, random_state=None):
     """
     sample a set Y from a dpp.  evalue, evector are a decomposed kernel, and k is (optionally) the size of the set to return
     :param evalue: eigenvalue
     :param evector: normalized eigenvector
     :param k: number of cluster
+    :param random_state: seed, RandomState instance or None (numpy global random state)
     :return:
     """
+    random_state = check_random_state(random_state)
     if k == None:
         # choose eigenvectors randomly
         evalue = np.divide(evalue, (1 + evalue))
-        evector = np.where(np.random.random(evalue.shape[0]) <= evalue)[0]
+        evector = np.where(random_state.random_sample(evalue.shape[0]) <= evalue)[0]
     else:
-        v = sample_k(evalue, k)  # v here is a 1d array with size: k
+        v = sample_k(evalue, k, random_state)  # v here is a 1d array with size: k
 
     k = v.shape[0]
     v = v.astype(int)
@@ -58,7 +65,7 @@ def sample_dpp(evalue, evector, k=None):
         P = P / np.sum(P)
 
         # choose a new item to include
-        y[i - 1] = np.where(np.random.rand(1) < np.cumsum(P))[0][0]
+        y[i - 1] = np.where(random_state.rand(1) < np.cumsum(P))[0][0]
         y = y.astype(int)
 
         # choose a vector to eliminate
@@ -76,7 +83,7 @@ def sample_dpp(evalue, evector, k=None):
         # orthogonalize
         for m in range(i - 1):
             for n in range(m):
-                V[:, m] = np.subtract(V[:, m], np.matmul(V[:, m].transpose(), V[:, n]) * V[:, n])
+                V[:, m] = np.subtract(V[:, m], (V[:, m] @ V[:, n]) * V[:, n])
 
             V[:, m] = V[:, m] / np.linalg.norm(V[:, m])
 
@@ -85,13 +92,15 @@ def sample_dpp(evalue, evector, k=None):
     return y
 
 
-def sample_k(lambda_value, k):
+def sample_k(lambda_value, k, random_state=None):
     """
     Pick k lambdas according to p(S) \propto prod(lambda \in S)
     :param lambda_value: the corresponding eigenvalues
     :param k: the number of clusters
+    :param random_state: seed, RandomState instance or None (numpy global random state)
     :return:
     """
+    random_state = check_random_state(random_state)
 
     ## compute elementary symmetric polynomials
     E = elem_sym_poly(lambda_value, k)
@@ -108,7 +117,7 @@ def sample_k(lambda_value, k):
             marg = lambda_value[num - 1] * E[remaining - 1, num - 1] / E[remaining, num]
 
         # sample marginal
-        if np.random.rand(1) < marg:
+        if random_state.rand(1) < marg:
             S[remaining - 1] = num
             remaining = remaining - 1
         num = num - 1
@@ -137,23 +146,15 @@ def elem_sym_poly(lambda_value, k):
 
 def consensus_clustering(clustering_results, k, cluster_weight=None):
     num_pt = clustering_results.shape[0]
-    cooccurence_matrix = np.zeros((num_pt, num_pt))
-
-    for i in range(num_pt - 1):
-        for j in range(i + 1, num_pt):
-            if cluster_weight is None:
-                cooccurence_matrix[i, j] = sum(clustering_results[i, :] == clustering_results[j, :])
-            else:
-                cooccurence_matrix[i, j] = sum(
-                    cluster_weight * (clustering_results[i, :] == clustering_results[j, :]).astype(np.int))
-
-    cooccurence_matrix = np.add(cooccurence_matrix, cooccurence_matrix.transpose())
+    cooccurence_matrix = count_co_occurrences(clustering_results, clustering_results, weights=cluster_weight)
+    np.fill_diagonal(cooccurence_matrix, 0)
     # here is to compute the Laplacian matrix
     Laplacian = np.subtract(np.diag(np.sum(cooccurence_matrix, axis=1)), cooccurence_matrix)
 
-    Laplacian_norm = np.subtract(np.eye(num_pt), np.matmul(
-        np.matmul(np.diag(1 / np.sqrt(np.sum(cooccurence_matrix, axis=1))), cooccurence_matrix),
-        np.diag(1 / np.sqrt(np.sum(cooccurence_matrix, axis=1)))))
+    # scale rows and columns by the inverse square root degrees instead of multiplying by diagonal matrices
+    inv_sqrt_degrees = 1 / np.sqrt(np.sum(cooccurence_matrix, axis=1))
+    Laplacian_norm = np.subtract(np.eye(num_pt),
+                                 cooccurence_matrix * inv_sqrt_degrees[:, None] * inv_sqrt_degrees[None, :])
     # replace the nan with 0
     Laplacian_norm = np.nan_to_num(Laplacian_norm)
 
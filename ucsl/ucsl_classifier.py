@@ -1,9 +1,11 @@
 import copy
 import logging
 
+from joblib import Parallel, delayed, effective_n_jobs
+from scipy.spatial.distance import cdist
 from sklearn.base import ClassifierMixin
-from sklearn.metrics import adjusted_rand_score as ARI
 from sklearn.mixture import GaussianMixture
+from sklearn.utils import check_random_state
 
 from ucsl.base import *
 from ucsl.dpp_utils import *
@@ -35,6 +37,12 @@ class UCSL_C(BaseEM, ClassifierMixin):
         It must be one of "all", "soft_clustering", "hard_clustering".
         ie : the importance of non-clustered label in the SVM computation
         If not specified, ucsl original "all" will be used.
+    n_jobs : int, optional (default=None)
+        Number of jobs used to run the consensus runs and to fit the hyperplanes of the different clusters in parallel,
+        If not specified, they are run one after the other.
+    random_state : int, RandomState instance or None, optional (default=None)
+        Seed of the random number generator used by the initializations, clusterings and hyperplane fits,
+        If not specified, the global numpy random number generator will be used.
     """
 
     def __init__(self, stability_threshold=0.85, noise_tolerance_threshold=10, C=0.1, covariance_type='full',
@@ -42,7 +50,8 @@ class UCSL_C(BaseEM, ClassifierMixin):
                  initialization="gaussian_mixture", clustering='gaussian_mixture', consensus='spectral_clustering', maximization='logistic',
                  custom_clustering_method=None, custom_maximization_method=None,
                  negative_weighting='soft_clustering', positive_weighting='hard_clustering',
-                 training_label_mapping=None, custom_initialization_matrixes=None):
+                 training_label_mapping=None, custom_initialization_matrixes=None, n_jobs=None,
+                 random_state=None):
 
         super().__init__(initialization=initialization, clustering=clustering, consensus=consensus,
                          maximization=maximization,
@@ -63,6 +72,9 @@ class UCSL_C(BaseEM, ClassifierMixin):
         # define C hyperparameter if the classification method is max-margin
         self.C = C
         self.covariance_type=covariance_type
+        self.n_jobs = n_jobs
+        self.maximization_n_jobs = n_jobs
+        self.random_state = random_state
 
         # define n_labels and n_clusters per label
         assert (n_labels >= 2), "The number of labels must be at least 2"
@@ -104,14 +116,18 @@ class UCSL_C(BaseEM, ClassifierMixin):
                              range(self.n_labels)}
         self.intercepts = {label: {cluster_i: [] for cluster_i in range(self.n_clusters_per_label[label])} for label in
                            range(self.n_labels)}
+        # same directions and intercepts stacked in a (n_clusters, n_features) matrix and a (n_clusters,) vector
+        self.stacked_coefficients = {label: None for label in range(self.n_labels)}
+        self.stacked_intercepts = {label: None for label in range(self.n_labels)}
+        # scale of the binary logits, fixed on the training samples
+        self.logit_scale = 1
 
         # TODO : Get rid of these visualization helps
         self.S_lists = {label: dict() for label in range(self.n_labels)}
-        self.coefficient_lists = {label: {cluster_i: dict() for cluster_i in range(self.n_clusters_per_label[label])} for
-                                  label in
-                                  range(self.n_labels)}
-        self.intercept_lists = {label: {cluster_i: dict() for cluster_i in range(self.n_clusters_per_label[label])} for label
-                                in range(self.n_labels)}
+        # coefficients and intercepts per iteration, shaped (n_iterations + 2, n_clusters(, n_features)), allocated in run
+        # row iteration + 1 holds the maximization step of that iteration, the last row holds the bagging refit
+        self.coefficient_history = {label: None for label in range(self.n_labels)}
+        self.intercept_history = {label: None for label in range(self.n_labels)}
 
         # store intermediate and consensus results in dictionaries
         self.cluster_labels_ = {label: None for label in range(self.n_labels)}
@@ -122,6 +138,8 @@ class UCSL_C(BaseEM, ClassifierMixin):
         # define orthonormal directions basis and clustering methods at each consensus step
         self.orthonormal_basis = {label: {c: {} for c in range(n_consensus)} for label in range(self.n_labels)}
         self.clustering_method = {label: {c: {} for c in range(n_consensus)} for label in range(self.n_labels)}
+        # training samples projected on each consensus basis, only kept while a label is being clustered
+        self.projection_cache = dict()
 
     def fit(self, X_train, y_train):
         """Fit the ucsl model according to the given training data.
@@ -135,15 +153,33 @@ class UCSL_C(BaseEM, ClassifierMixin):
         -------
         self
         """
+        self.random_state_ = check_random_state(self.random_state)
+
         # apply label mapping (in our case we merged "BIPOLAR" and "SCHIZOPHRENIA" into "MENTAL DISEASE" for our xp)
-        y_train_copy = y_train.copy()
-        for original_label, new_label in self.training_label_mapping.items():
-            y_train_copy[y_train == original_label] = new_label
+        # the mapping is applied in one pass by looking up each label among the sorted original labels
+        if len(self.training_label_mapping) > 0:
+            original_labels = np.array(list(self.training_label_mapping.keys()))
+            new_labels = np.array(list(self.training_label_mapping.values()))
+            order = np.argsort(original_labels)
+            original_labels, new_labels = original_labels[order], new_labels[order]
+            positions = np.minimum(np.searchsorted(original_labels, y_train), len(original_labels) - 1)
+            y_train_copy = np.where(original_labels[positions] == y_train, new_labels[positions], y_train)
+        else:
+            y_train_copy = np.copy(y_train)
 
         # cluster each label one by one and confine the other inside the polytope
         for label in range(self.n_labels):
             self.run(X_train, y_train_copy, self.n_clusters_per_label[label], idx_outside_polytope=label)
 
+        # the binary logits are scaled at inference by a constant recorded on the training samples
+        if self.n_labels == 2 and self.maximization in ['max_margin', 'logistic'] and self.clustering != 'HYDRA':
+            X_train_float32 = np.asarray(X_train, dtype=np.float32)
+            train_logits = self.compute_binary_logits(self.compute_distances_to_hyperplanes(X_train_float32),
+                                                      self.predict_clusters(X_train_float32))
+            # a degenerate fit may leave all the training logits at 0, the scale then stays at 1
+            logit_scale = np.max(np.abs(train_logits))
+            self.logit_scale = logit_scale if logit_scale > 0 else 1
+
         return self
 
     def predict(self, X):
@@ -158,6 +194,9 @@ class UCSL_C(BaseEM, ClassifierMixin):
             Predictions of the labels of the query points.
         """
         y_pred = self.predict_proba(X)
+        if self.n_labels == 2:
+            # with two labels, thresholding the positive probability is enough (ties go to label 0, as with argmax)
+            return (y_pred[:, 1] > 0.5).astype(np.int64)
         return np.argmax(y_pred, 1)
 
     def predict_proba(self, X):
@@ -171,6 +210,8 @@ class UCSL_C(BaseEM, ClassifierMixin):
         y_pred : array, shape (n_samples, n_labels)
             Predictions of the probabilities of the query points belonging to labels.
         """
+        # single precision is enough for the distances and scores, and halves the memory read by the products
+        X = np.asarray(X, dtype=np.float32)
         y_pred = np.zeros((len(X), self.n_labels))
 
         if self.maximization in ['max_margin', 'logistic']:
@@ -181,31 +222,44 @@ class UCSL_C(BaseEM, ClassifierMixin):
                     y_pred[:, 1] = sigmoid(np.max(hp_distances[1], 1) - np.max(hp_distances[0], 1))
                     y_pred[:, 0] = 1 - y_pred[:, 1]
                 else:
-                    for label in range(self.n_labels):
-                        y_pred[:, label] = np.max(hp_distances[label], 1)
-                    y_pred = py_softmax(y_pred, axis=1)
+                    y_pred[:] = py_softmax(np.column_stack([np.max(hp_distances[label], 1) for label in range(self.n_labels)]),
+                                           axis=1)
 
             else:
                 # compute the predictions \w.r.t cluster previously found
                 cluster_predictions = self.predict_clusters(X)
                 if self.n_labels == 2:
-                    y_pred[:, 1] = sum(
-                        [np.rint(cluster_predictions[1])[:, cluster] * hp_distances[1][:, cluster] for cluster in
-                         range(self.n_clusters_per_label[1])])
-                    y_pred[:, 1] -= sum([cluster_predictions[0][:, cluster] * hp_distances[0][:, cluster] for cluster in
-                                         range(self.n_clusters_per_label[0])])
-                    # compute probabilities \w sigmoid
-                    y_pred[:, 1] = sigmoid(y_pred[:, 1] / np.max(y_pred[:, 1]))
+                    # compute probabilities \w sigmoid, the logits being scaled by a constant fixed at training
+                    y_pred[:, 1] = sigmoid(self.compute_binary_logits(hp_distances, cluster_predictions) / self.logit_scale)
                     y_pred[:, 0] = 1 - y_pred[:, 1]
                 else:
-                    for label in range(self.n_labels):
-                        y_pred[:, label] = sum(
-                            [cluster_predictions[label][:, cluster] * hp_distances[label][:, cluster] for cluster in
-                             range(self.n_clusters_per_label[label])])
-                    y_pred = py_softmax(y_pred, axis=1)
+                    # cluster-weighted sums of the distances to the hyperplanes, in a single pass for each label
+                    n_clusters = self.n_clusters_per_label
+                    y_pred[:] = py_softmax(np.column_stack(
+                        [np.einsum('nc,nc->n', cluster_predictions[label][:, :n_clusters[label]],
+                                   hp_distances[label][:, :n_clusters[label]]) for label in range(self.n_labels)]), axis=1)
 
         return y_pred
 
+    def compute_binary_logits(self, hp_distances, cluster_predictions):
+        """Merge the distances to the hyperplanes of the two labels into a single logit per sample.
+        Parameters
+        ----------
+        hp_distances : dict of array, length (n_labels), shape of element (n_samples, n_clusters[label])
+            Distances of the samples to the hyperplanes of each cluster of each label.
+        cluster_predictions : dict of array, length (n_labels), shape of element (n_samples, n_clusters[label])
+            Clustering predictions of the samples for each label.
+        Returns
+        -------
+        logits : array, shape (n_samples,)
+            Cluster-weighted distances of the samples to the label 1 hyperplanes minus the label 0 ones.
+        """
+        # cluster-weighted sums of the distances to the hyperplanes, in a single pass for each label
+        n_clusters = self.n_clusters_per_label
+        logits = np.einsum('nc,nc->n', np.rint(cluster_predictions[1][:, :n_clusters[1]]), hp_distances[1][:, :n_clusters[1]])
+        logits -= np.einsum('nc,nc->n', cluster_predictions[0][:, :n_clusters[0]], hp_distances[0][:, :n_clusters[0]])
+        return logits
+
     def compute_distances_to_hyperplanes(self, X):
         """Predict using the ucsl model.
         Parameters
@@ -218,15 +272,44 @@ class UCSL_C(BaseEM, ClassifierMixin):
             Predictions of the point/hyperplane margin for each cluster of each label.
         """
         # first compute points distances to hyperplane
-        SVM_distances = {label: np.zeros((len(X), self.n_clusters_per_label[label])) for label in range(self.n_labels)}
-
-        for label in range(self.n_labels):
-            for cluster_i in range(self.n_clusters_per_label[label]):
-                SVM_coefficient = self.coefficients[label][cluster_i]
-                SVM_intercept = self.intercepts[label][cluster_i]
-                SVM_distances[label][:, cluster_i] = X @ SVM_coefficient[0] + SVM_intercept[0]
+        SVM_distances = {label: self.compute_label_distances_to_hyperplanes(X, label) for label in range(self.n_labels)}
         return SVM_distances
 
+    def compute_label_distances_to_hyperplanes(self, X, idx_outside_polytope):
+        """Compute the points/hyperplanes margins of every cluster of one label with a single product.
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+            Query points to be evaluate.
+        idx_outside_polytope : int
+            label whose hyperplanes are used
+        Returns
+        -------
+        SVM_distances : array-like, shape (n_samples, n_clusters)
+            Predictions of the point/hyperplane margin for each cluster of the label.
+        """
+        # the (small) hyperplanes matrix follows the samples precision so that the product stays in BLAS
+        coefficients = self.stacked_coefficients[idx_outside_polytope].astype(X.dtype, copy=False)
+        intercepts = self.stacked_intercepts[idx_outside_polytope].astype(X.dtype, copy=False)
+        return X @ coefficients.T + intercepts
+
+    def stack_hyperplanes(self, idx_outside_polytope, n_clusters):
+        """Stack the directions and intercepts of a label so that all its hyperplanes are applied with one product.
+        Parameters
+        ----------
+        idx_outside_polytope : int
+            label that is being clustered
+        n_clusters : int
+            number of clusters
+        Returns
+        -------
+        None
+        """
+        self.stacked_coefficients[idx_outside_polytope] = np.array(
+            [self.coefficients[idx_outside_polytope][cluster][0] for cluster in range(n_clusters)])
+        self.stacked_intercepts[idx_outside_polytope] = np.array(
+            [self.intercepts[idx_outside_polytope][cluster][0] for cluster in range(n_clusters)])
+
     def predict_clusters(self, X):
         """Predict clustering for each label in a hierarchical manner.
         Parameters
@@ -238,44 +321,37 @@ class UCSL_C(BaseEM, ClassifierMixin):
         cluster_predictions : dict of arrays, length (n_labels) , shape per key:(n_samples, n_clusters[key])
             Dict containing clustering predictions for each label, the dictionary keys are the labels
         """
+        X = np.asarray(X, dtype=np.float32)
         cluster_predictions = {label: np.zeros((len(X), self.n_clusters_per_label[label])) for label in
                                range(self.n_labels)}
 
         if self.clustering in ['HYDRA']:
-            SVM_distances = {label: np.zeros((len(X), self.n_clusters_per_label[label])) for label in
-                             range(self.n_labels)}
+            # the SVM scores are shifted by their minimum, so the distances to hyperplanes can be used as is
+            SVM_distances = self.compute_distances_to_hyperplanes(X)
 
             for label in range(self.n_labels):
-                # fulfill the SVM score matrix
-                for cluster in range(self.n_clusters_per_label[label]):
-                    SVM_coefficient = self.coefficients[label][cluster]
-                    SVM_intercept = self.intercepts[label][cluster]
-                    SVM_distances[label][:, cluster] = 1 + X @ SVM_coefficient[0] + SVM_intercept[0]
-
                 # compute clustering conditional probabilities as in the original ucsl paper : P(cluster=i|y=label)
-                SVM_distances[label] -= np.min(SVM_distances[label])
-                SVM_distances[label] += 1e-3
-
-            for label in range(self.n_labels):
-                cluster_predictions[label] = SVM_distances[label] / np.sum(SVM_distances[label], 1)[:, None]
+                # the distances are computed in single precision, the probabilities are returned in double precision
+                cluster_predictions[label] = svm_scores_to_cluster_proba(SVM_distances[label]).astype(np.float64)
 
         elif self.clustering in ['k_means', 'gaussian_mixture', 'custom']:
             for label in range(self.n_labels):
                 if self.n_clusters_per_label[label] > 1:
-                    X_proj = X @ self.orthonormal_basis[label][-1].T
+                    X_proj = X @ self.orthonormal_basis[label][-1].astype(X.dtype, copy=False).T
+                    # the fitted clustering methods expect double precision, the projection is small anyway
+                    X_proj = X_proj.astype(np.float64)
                     if self.clustering == 'k_means':
                         cluster_predictions[label] = one_hot_encode(
-                            self.clustering_method[label][-1].predict(X_proj).astype(np.int),
+                            self.clustering_method[label][-1].predict(X_proj),
                             n_classes=self.n_clusters_per_label[label])
                     elif self.clustering == 'gaussian_mixture':
-                        cluster_predictions[label] = self.clustering_method[label][-1].predict_proba(X_proj)
+                        cluster_predictions[label] = gaussian_mixture_proba(self.clustering_method[label][-1], X_proj)
                     elif self.clustering == 'custom':
-                        Q_distances = np.zeros((len(X_proj), len(self.barycenters[label])))
-                        for cluster in range(len(self.barycenters[label])):
-                            if X_proj.shape[1] > 1:
-                                Q_distances[:, cluster] = np.sum(np.abs(X_proj - self.barycenters[label][cluster]), 1)
-                            else:
-                                Q_distances[:, cluster] = (X_proj - self.barycenters[label][cluster][None, :])[:, 0]
+                        # distances to all the barycenters at once, without a (n_samples, basis_dim) temporary per cluster
+                        if X_proj.shape[1] > 1:
+                            Q_distances = cdist(X_proj, self.barycenters[label], metric='cityblock')
+                        else:
+                            Q_distances = X_proj - self.barycenters[label].T
                         Q_distances /= np.sum(Q_distances, 1)[:, None]
                         cluster_predictions[label] = 1 - Q_distances
                 else:
@@ -284,48 +360,140 @@ class UCSL_C(BaseEM, ClassifierMixin):
 
     def run(self, X, y, n_clusters, idx_outside_polytope):
         # set label idx_outside_polytope outside of the polytope by setting it to positive labels
-        y_polytope = np.copy(y)
-        # if label is inside of the polytope, the distance is negative and the label is not divided into
-        y_polytope[y_polytope != idx_outside_polytope] = -1
         # if label is outside of the polytope, the distance is positive and the label is clustered
-        y_polytope[y_polytope == idx_outside_polytope] = 1
+        # if label is inside of the polytope, the distance is negative and the label is not divided into
+        y_polytope = np.where(y == idx_outside_polytope, 1, -1).astype(np.int8)
 
-        index_positives = np.where(y_polytope == 1)[0]  # index for Positive labels (outside polytope)
-        index_negatives = np.where(y_polytope == -1)[0]  # index for Negative labels (inside polytope)
+        index_positives = np.flatnonzero(y_polytope == 1)  # index for Positive labels (outside polytope)
+        index_negatives = np.flatnonzero(y_polytope == -1)  # index for Negative labels (inside polytope)
 
         if n_clusters == 1:
             # by default, when we do not want to cluster a label, we train a simple linear SVM
-            SVM_coefficient, SVM_intercept = launch_svc(X, y_polytope, C=self.C)
+            SVM_coefficient, SVM_intercept = launch_svc(X, y_polytope, C=self.C,
+                                                        random_state=self.random_state_.randint(np.iinfo(np.int32).max))
             self.coefficients[idx_outside_polytope][0] = SVM_coefficient
             self.intercepts[idx_outside_polytope][0] = SVM_intercept
+            self.stack_hyperplanes(idx_outside_polytope, n_clusters)
             n_consensus = 0
         else:
             n_consensus = self.n_consensus
             # define the clustering assignment matrix (each column correspond to one consensus run)
             self.clustering_assignments[idx_outside_polytope] = np.zeros((len(index_positives), n_consensus))
-
-        for consensus in range(n_consensus):
-            # first we initialize the clustering matrix S, with the initialization strategy set in self.initialization
-            S, cluster_index, n_clusters = self.initialize_clustering(X, y_polytope, index_positives, index_negatives, n_clusters, idx_outside_polytope)
-            if self.negative_weighting in ['all']:
-                S[index_negatives] = 1 / n_clusters
-            elif self.negative_weighting in ['hard_clustering']:
-                S[index_negatives] = np.rint(S[index_negatives])
-            if self.positive_weighting in ['hard_clustering']:
-                S[index_positives] = np.rint(S[index_positives])
-
             # TODO : Get rid of these visualization helps
-            self.S_lists[idx_outside_polytope][0] = S.copy()
-
-            cluster_index = self.run_EM(X, y, y_polytope, S, cluster_index, index_positives, index_negatives,
-                                        idx_outside_polytope, n_clusters, self.stability_threshold, consensus)
-
+            self.coefficient_history[idx_outside_polytope] = np.zeros((self.n_iterations + 2, n_clusters, X.shape[1]))
+            self.intercept_history[idx_outside_polytope] = np.zeros((self.n_iterations + 2, n_clusters))
+
+        # the consensus runs are independent, each one is seeded so that the result does not depend on n_jobs
+        seeds = self.random_state_.randint(np.iinfo(np.int32).max, size=n_consensus + 1)
+        # when the consensus runs are spread over several workers, the hyperplanes of each run are fitted sequentially
+        # so that the workers do not oversubscribe the CPU
+        maximization_n_jobs = 1 if n_consensus > 1 and effective_n_jobs(self.n_jobs) > 1 else self.n_jobs
+        # the runs are pinned to processes, LIBLINEAR draws from a process-wide C random generator and concurrent
+        # fits in threads of the same process would interleave its draws
+        consensus_results = Parallel(n_jobs=self.n_jobs, backend="loky")(
+            delayed(self.run_consensus)(X, y, y_polytope, index_positives, index_negatives, idx_outside_polytope,
+                                        n_clusters, consensus, seeds[consensus], maximization_n_jobs)
+            for consensus in range(n_consensus))
+
+        for consensus, (cluster_index, n_clusters, basis, clustering_method, X_proj, label_state) in enumerate(consensus_results):
             # update the cluster index for the consensus clustering
             self.clustering_assignments[idx_outside_polytope][:, consensus] = cluster_index
+            self.orthonormal_basis[idx_outside_polytope][consensus] = basis
+            self.clustering_method[idx_outside_polytope][consensus] = clustering_method
+            if X_proj is not None:
+                self.projection_cache[consensus] = (X, basis, X_proj)
+        if n_consensus > 0:
+            # as with sequential runs, the label-wide attributes are the ones left by the last consensus run
+            self.coefficients[idx_outside_polytope] = label_state['coefficients']
+            self.intercepts[idx_outside_polytope] = label_state['intercepts']
+            self.stacked_coefficients[idx_outside_polytope] = label_state['stacked_coefficients']
+            self.stacked_intercepts[idx_outside_polytope] = label_state['stacked_intercepts']
+            self.coefficient_history[idx_outside_polytope] = label_state['coefficient_history']
+            self.intercept_history[idx_outside_polytope] = label_state['intercept_history']
+            self.S_lists[idx_outside_polytope] = label_state['S_lists']
+            # the best basis and clustering method are only set by some of the clustering methods
+            if label_state['best_basis'] is not None:
+                self.orthonormal_basis[idx_outside_polytope][-1] = label_state['best_basis']
+            if label_state['best_clustering_method'] is not None:
+                self.clustering_method[idx_outside_polytope][-1] = label_state['best_clustering_method']
+            # the runs may have consumed the random state in other processes, the bagging step gets its own seed
+            self.random_state_ = np.random.RandomState(seeds[-1])
 
         if n_consensus > 1:
             self.clustering_bagging(X, y, y_polytope, index_positives, index_negatives, idx_outside_polytope,
                                     n_clusters)
+        self.projection_cache = dict()
+
+    def run_consensus(self, X, y, y_polytope, index_positives, index_negatives, idx_outside_polytope, n_clusters,
+                      consensus, seed, maximization_n_jobs=None):
+        """Perform one consensus run : initialize the clustering and run the EM algorithm until convergence.
+        The run works on a copy of the estimator, which is left unchanged.
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+            Training vectors.
+        y : array-like, shape (n_samples,)
+            Original target values.
+        y_polytope : array-like, shape (n_samples,)
+            Target values.
+        index_positives : array-like, shape (n_positives_samples,)
+            indexes of the positive labels being clustered
+        index_negatives : array-like, shape (n_negatives_samples, )
+            indexes of the negatives labels not being clustered
+        idx_outside_polytope : int
+            label that is being clustered
+        n_clusters : int
+            number of clusters
+        consensus : int
+            index of consensus
+        seed : int
+            seed of the random number generator used by this consensus run
+        maximization_n_jobs : int, optional (default=None)
+            number of jobs used to fit the hyperplanes of the different clusters during this consensus run
+        Returns
+        -------
+        cluster_index : array-like, shape (n_positives_samples, )
+            clusters predictions argmax for positive samples.
+        n_clusters : int
+            number of clusters
+        basis : array-like, shape (n_basis_directions, n_features)
+            orthonormal basis found by the consensus run
+        clustering_method : estimator
+            clustering method fitted by the consensus run
+        X_proj : array-like, shape (n_samples, n_basis_directions)
+            training samples projected on the basis, None if they were not projected
+        label_state : dict
+            coefficients, intercepts, stacked hyperplanes, best basis and clustering method, histories and S_lists
+            of the label, as left by the consensus run
+        """
+        # the run works on its own copy of the estimator, so that it shares no state with the other runs
+        # whatever the joblib backend, and it gets its own random state
+        estimator = copy.deepcopy(self)
+        estimator.random_state_ = np.random.RandomState(seed)
+        estimator.maximization_n_jobs = maximization_n_jobs
+
+        # first we initialize the clustering matrix S, with the initialization strategy set in self.initialization
+        S, cluster_index, n_clusters = estimator.initialize_clustering(X, y_polytope, index_positives, index_negatives, n_clusters, idx_outside_polytope)
+        estimator.apply_weighting(S, index_positives, index_negatives, n_clusters)
+
+        # TODO : Get rid of these visualization helps
+        estimator.S_lists[idx_outside_polytope][0] = S.copy()
+
+        cluster_index = estimator.run_EM(X, y, y_polytope, S, cluster_index, index_positives, index_negatives,
+                                         idx_outside_polytope, n_clusters, estimator.stability_threshold, consensus)
+
+        X_proj = estimator.projection_cache[consensus][2] if consensus in estimator.projection_cache else None
+        label_state = {'coefficients': estimator.coefficients[idx_outside_polytope],
+                       'intercepts': estimator.intercepts[idx_outside_polytope],
+                       'stacked_coefficients': estimator.stacked_coefficients[idx_outside_polytope],
+                       'stacked_intercepts': estimator.stacked_intercepts[idx_outside_polytope],
+                       'best_basis': estimator.orthonormal_basis[idx_outside_polytope].get(-1),
+                       'best_clustering_method': estimator.clustering_method[idx_outside_polytope].get(-1),
+                       'coefficient_history': estimator.coefficient_history[idx_outside_polytope],
+                       'intercept_history': estimator.intercept_history[idx_outside_polytope],
+                       'S_lists': estimator.S_lists[idx_outside_polytope]}
+        return (cluster_index, n_clusters, estimator.orthonormal_basis[idx_outside_polytope][consensus],
+                estimator.clustering_method[idx_outside_polytope][consensus], X_proj, label_state)
 
     def initialize_clustering(self, X, y_polytope, index_positives, index_negatives, n_clusters, idx_outside_polytope):
         """Perform a bagging of the previously obtained clusterings and compute new hyperplanes.
@@ -349,50 +517,58 @@ class UCSL_C(BaseEM, ClassifierMixin):
             Cluster prediction matrix.
         """
         S = np.ones((len(y_polytope), n_clusters)) / n_clusters
+        # gather the positive samples once, fancy indexing copies them at every call
+        X_positives = X[index_positives]
 
         if self.initialization == "DPP":
+            X_negatives = X[index_negatives]
             num_subject = y_polytope.shape[0]
-            W = np.zeros((num_subject, X.shape[1]))
-            for j in range(num_subject):
-                ipt = np.random.randint(len(index_positives))
-                icn = np.random.randint(len(index_negatives))
-                W[j, :] = X[index_positives[ipt], :] - X[index_negatives[icn], :]
-
-            KW = np.matmul(W, W.transpose())
-            KW = np.divide(KW, np.sqrt(np.multiply(np.diag(KW)[:, np.newaxis], np.diag(KW)[:, np.newaxis].transpose())))
-            evalue, evector = np.linalg.eig(KW)
-            Widx = sample_dpp(np.real(evalue), np.real(evector), n_clusters)
-            prob = np.zeros((len(index_positives), n_clusters))  # only consider the PTs
-
-            for i in range(n_clusters):
-                prob[:, i] = np.matmul(
-                    np.multiply(X[index_positives, :],
-                                np.divide(1, np.linalg.norm(X[index_positives, :], axis=1))[:, np.newaxis]),
-                    W[Widx[i], :].transpose())
+            # draw all the (positive, negative) pairs at once
+            ipt = self.random_state_.randint(len(index_positives), size=num_subject)
+            icn = self.random_state_.randint(len(index_negatives), size=num_subject)
+            W = X_positives[ipt] - X_negatives[icn]
+
+            # KW = Wn @ Wn.T with Wn the row-normalized W, its spectrum is read exactly from the thin SVD of Wn
+            # KW has rank n_features at most, the eigenvectors beyond only span its null space
+            Wn = W / np.linalg.norm(W, axis=1)[:, np.newaxis]
+            if n_clusters <= min(Wn.shape):
+                evector, singular_values, _ = np.linalg.svd(Wn, full_matrices=False)
+                # ascending order, as returned by the symmetric eigen solver
+                evalue, evector = np.square(singular_values[::-1]), evector[:, ::-1]
+            else:
+                # more clusters than the rank of KW, the sampling also needs the null space eigenvectors
+                evalue, evector = np.linalg.eigh(Wn @ Wn.T)
+            Widx = sample_dpp(evalue, evector, n_clusters, random_state=self.random_state_)
+
+            # only consider the PTs
+            X_positives_normalized = X_positives / np.linalg.norm(X_positives, axis=1)[:, np.newaxis]
+            prob = X_positives_normalized @ W[Widx].T
 
             prob = py_softmax(prob, 1)
             S[index_positives] = prob
 
         if self.initialization in ["k_means"]:
-            KM = KMeans(n_clusters=self.n_clusters_per_label[idx_outside_polytope], init="random" , n_init=1).fit(X[index_positives])
+            KM = KMeans(n_clusters=self.n_clusters_per_label[idx_outside_polytope], init="random" , n_init=1, random_state=self.random_state_).fit(X_positives)
             S = one_hot_encode(KM.predict(X))
 
         if self.initialization in ["gaussian_mixture"]:
-            GMM = GaussianMixture(n_components=self.n_clusters_per_label[idx_outside_polytope], init_params="random", n_init=1, covariance_type=self.covariance_type).fit(X[index_positives])
+            GMM = GaussianMixture(n_components=self.n_clusters_per_label[idx_outside_polytope], init_params="random", n_init=1, covariance_type=self.covariance_type, random_state=self.random_state_).fit(X_positives)
             S = GMM.predict_proba(X)
 
         if self.initialization in ['custom']:
             custom_clustering_method_ = copy.deepcopy(self.custom_clustering_method)
-            S_positives = custom_clustering_method_.fit_predict(X[index_positives])
+            S_positives = custom_clustering_method_.fit_predict(X_positives)
             S_distances = np.zeros((len(X), np.max(S_positives) + 1))
             for cluster in range(np.max(S_positives) + 1):
-                S_distances[:, cluster] = np.sum(np.abs(X - np.mean(X[index_positives][S_positives == cluster], 0)[None, :]), 1)
+                S_distances[:, cluster] = np.sum(np.abs(X - np.mean(X_positives[S_positives == cluster], 0)[None, :]), 1)
             S_distances /= np.sum(S_distances, 1)[:, None]
             S = 1 - S
 
         if self.initialization == "precomputed":
             S = self.custom_initialization_matrixes[idx_outside_polytope]
 
+        # S is kept column-major so that the cluster weightings used by the maximization step are contiguous
+        S = np.asfortranarray(S)
         cluster_index = np.argmax(S[index_positives], axis=1)
 
         if self.adaptive_clustering_per_label[idx_outside_polytope]:
@@ -400,25 +576,56 @@ class UCSL_C(BaseEM, ClassifierMixin):
 
         return S, cluster_index, n_clusters
 
+    def apply_weighting(self, S, index_positives, index_negatives, n_clusters):
+        """Apply the negative and positive weightings set as input to the clustering matrix, in place.
+        Parameters
+        ----------
+        S : array-like, shape (n_samples, n_clusters)
+            Cluster prediction matrix.
+        index_positives : array-like, shape (n_positives_samples,)
+            indexes of the positive labels being clustered
+        index_negatives : array-like, shape (n_negatives_samples, )
+            indexes of the negatives labels not being clustered
+        n_clusters : int
+            number of clusters
+        Returns
+        -------
+        None
+        """
+        if self.negative_weighting in ['all']:
+            # scalar broadcast, no (n_negatives_samples, n_clusters) matrix is built
+            S[index_negatives] = 1 / n_clusters
+        elif self.negative_weighting in ['hard_clustering']:
+            S[index_negatives] = np.rint(S[index_negatives])
+        if self.positive_weighting in ['hard_clustering']:
+            S[index_positives] = np.rint(S[index_positives])
+
     def maximization_step(self, X, y_polytope, S, idx_outside_polytope, n_clusters, iteration):
         if self.maximization == "max_margin":
-            for cluster in range(n_clusters):
-                cluster_assignment = np.ascontiguousarray(S[:, cluster])
-                SVM_coefficient, SVM_intercept = launch_svc(X, y_polytope, cluster_assignment, C=self.C)
+            # the hyperplanes of the different clusters are independent, they are fitted in separate processes since
+            # liblinear seeds and draws from a process-wide C random generator that concurrent threads would share
+            seeds = self.random_state_.randint(np.iinfo(np.int32).max, size=n_clusters)
+            SVM_results = Parallel(n_jobs=self.maximization_n_jobs, backend="loky")(
+                delayed(launch_svc)(X, y_polytope, S[:, cluster], C=self.C, random_state=seeds[cluster])
+                for cluster in range(n_clusters))
+            for cluster, (SVM_coefficient, SVM_intercept) in enumerate(SVM_results):
                 self.coefficients[idx_outside_polytope][cluster].extend(SVM_coefficient)
                 self.intercepts[idx_outside_polytope][cluster] = SVM_intercept
                 # TODO: get rid of
-                self.coefficient_lists[idx_outside_polytope][cluster][iteration + 1] = SVM_coefficient.copy()
-                self.intercept_lists[idx_outside_polytope][cluster][iteration + 1] = SVM_intercept.copy()
+                self.coefficient_history[idx_outside_polytope][iteration + 1, cluster] = SVM_coefficient[0]
+                self.intercept_history[idx_outside_polytope][iteration + 1, cluster] = SVM_intercept[0]
 
         elif self.maximization == "logistic":
-            for cluster in range(n_clusters):
-                cluster_assignment = np.ascontiguousarray(S[:, cluster])
-                logistic_coefficient, logistic_intercept = launch_logistic(X, y_polytope, cluster_assignment)
+            # the cluster-wise logistic regressions are independent as well, but lbfgs is driven from Python and only
+            # releases the GIL in its numpy products, so threads only give a partial speedup here
+            logistic_results = Parallel(n_jobs=self.maximization_n_jobs, prefer="threads")(
+                delayed(launch_logistic)(X, y_polytope, S[:, cluster])
+                for cluster in range(n_clusters))
+            for cluster, (logistic_coefficient, logistic_intercept) in enumerate(logistic_results):
                 self.coefficients[idx_outside_polytope][cluster].extend(logistic_coefficient)
                 self.intercepts[idx_outside_polytope][cluster] = logistic_intercept
                 # TODO: get rid of
-                self.coefficient_lists[idx_outside_polytope][cluster][iteration + 1] = logistic_coefficient.copy()
+                self.coefficient_history[idx_outside_polytope][iteration + 1, cluster] = logistic_coefficient[0]
 
     def expectation_step(self, X, S, index_positives, idx_outside_polytope, n_clusters, consensus):
         """Update clustering method (update clustering distribution matrix S).
@@ -446,79 +653,53 @@ class UCSL_C(BaseEM, ClassifierMixin):
         """
         Q = S.copy()
         if self.clustering == 'HYDRA':
-            SVM_distances = np.zeros(S.shape)
-            for cluster in range(n_clusters):
-                # Apply the data again the trained model to get the final SVM scores
-                SVM_coefficient = self.coefficients[idx_outside_polytope][cluster]
-                SVM_intercept = self.intercepts[idx_outside_polytope][cluster]
-                SVM_distances[:, cluster] = X @ SVM_coefficient[0] + SVM_intercept[0]
-
-            SVM_distances -= np.min(SVM_distances)
-            SVM_distances += 1e-3
-            Q = SVM_distances / np.sum(SVM_distances, 1)[:, None]
+            # Apply the data again the trained model to get the final SVM scores
+            SVM_distances = self.compute_label_distances_to_hyperplanes(X, idx_outside_polytope)
+            Q = svm_scores_to_cluster_proba(SVM_distances)
 
         if self.clustering in ['k_means', 'gaussian_mixture', 'custom']:
             # get directions
-            directions = []
-            for cluster in range(n_clusters):
-                directions.extend(self.coefficients[idx_outside_polytope][cluster])
-            norm_directions = [np.linalg.norm(direction) for direction in directions]
-            directions = np.array(directions) / np.array(norm_directions)[:, None]
-
-            # compute the most important vectors because Graam-Schmidt is not invariant by permutation when the matrix is not square
-            scores = []
-            for i, direction_i in enumerate(directions):
-                scores_i = []
-                for j, direction_j in enumerate(directions):
-                    if i != j:
-                        scores_i.append(np.linalg.norm(direction_i - (np.dot(direction_i, direction_j) * direction_j)))
-                scores.append(np.mean(scores_i))
-            directions = directions[np.array(scores).argsort()[::-1], :]
-
-            # orthonormalize coefficient/direction basis
-            basis = []
-            for v in directions:
-                w = v - np.sum(np.dot(v, b) * b for b in basis)
-                if len(basis) >= 2:
-                    if np.linalg.norm(w) * self.noise_tolerance_threshold > 1:
-                        basis.append(w / np.linalg.norm(w))
-                elif np.linalg.norm(w) > 1e-2:
-                    basis.append(w / np.linalg.norm(w))
-
-            self.orthonormal_basis[idx_outside_polytope][consensus] = np.array(basis)
-            self.orthonormal_basis[idx_outside_polytope][-1] = np.array(basis).copy()
-            X_proj = X @ self.orthonormal_basis[idx_outside_polytope][consensus].T
-
-            centroids = [np.mean(S[index_positives, cluster][:, None] * X_proj[index_positives, :], 0) for cluster in range(n_clusters)]
+            directions = normalized_directions(self.coefficients[idx_outside_polytope], n_clusters)
+
+            basis = graam_schmidt(directions, self.noise_tolerance_threshold)
+            self.orthonormal_basis[idx_outside_polytope][consensus] = basis
+            self.orthonormal_basis[idx_outside_polytope][-1] = basis
+            X_proj = self.project_on_basis(X, idx_outside_polytope, consensus)
+            # gather the positive samples once, they are used by every clustering method
+            X_proj_positives = X_proj[index_positives]
+
+            # weighted means of the positive samples for all the clusters at once
+            centroids = S[index_positives].T @ X_proj_positives / len(index_positives)
 
             if self.clustering == 'k_means':
                 self.clustering_method[idx_outside_polytope][consensus] = KMeans(
-                    n_clusters=n_clusters, init=np.array(centroids), n_init=1).fit(X_proj[index_positives])
-                Q_positives = self.clustering_method[idx_outside_polytope][consensus].fit_predict(X_proj[index_positives])
-                Q_distances = np.zeros((len(X_proj), np.max(Q_positives) + 1))
-                for cluster in range(np.max(Q_positives) + 1):
-                    Q_distances[:, cluster] = np.sum(np.abs(X_proj - self.clustering_method[idx_outside_polytope][consensus].cluster_centers_[cluster]), 1)
+                    n_clusters=n_clusters, init=centroids, n_init=1, random_state=self.random_state_)
+                Q_positives = self.clustering_method[idx_outside_polytope][consensus].fit_predict(X_proj_positives)
+                cluster_centers = self.clustering_method[idx_outside_polytope][consensus].cluster_centers_[:np.max(Q_positives) + 1]
+                Q_distances = cdist(X_proj, cluster_centers, metric='cityblock')
                 Q_distances = Q_distances / np.sum(Q_distances, 1)[:, None]
                 Q = 1 - Q_distances
 
             if self.clustering == 'gaussian_mixture':
                 self.clustering_method[idx_outside_polytope][consensus] = GaussianMixture(
-                    n_components=n_clusters, covariance_type=self.covariance_type, means_init=np.array(centroids)).fit(X_proj[index_positives])
-                Q = self.clustering_method[idx_outside_polytope][consensus].predict_proba(X_proj)
-                self.clustering_method[idx_outside_polytope][-1] = copy.deepcopy(
-                    self.clustering_method[idx_outside_polytope][consensus])
+                    n_components=n_clusters, covariance_type=self.covariance_type, means_init=centroids,
+                    random_state=self.random_state_).fit(X_proj_positives)
+                Q = gaussian_mixture_proba(self.clustering_method[idx_outside_polytope][consensus], X_proj)
+                self.clustering_method[idx_outside_polytope][-1] = self.clustering_method[idx_outside_polytope][consensus]
 
             if self.clustering in ['custom']:
                 self.clustering_method[idx_outside_polytope][consensus] = copy.deepcopy(self.custom_clustering_method)
-                Q_positives = self.clustering_method[idx_outside_polytope][consensus].fit_predict(X_proj[index_positives])
-                Q_distances = np.zeros((len(X_proj), np.max(Q_positives) + 1))
-                for cluster in range(np.max(Q_positives) + 1):
-                    Q_distances[:, cluster] = np.sum(np.abs(X_proj - np.mean(X_proj[index_positives][Q_positives == cluster], 0)[None, :]), 1)
+                Q_positives = self.clustering_method[idx_outside_polytope][consensus].fit_predict(X_proj_positives)
+                # noise points (labelled -1, e.g. by DBSCAN or OPTICS) do not contribute to any cluster center
+                clustered = Q_positives >= 0
+                cluster_assignment = one_hot_encode(Q_positives[clustered], n_classes=np.max(Q_positives) + 1)
+                cluster_centers = (cluster_assignment.T @ X_proj_positives[clustered]) / np.sum(cluster_assignment, 0)[:, None]
+                Q_distances = cdist(X_proj, cluster_centers, metric='cityblock')
                 Q_distances = Q_distances / np.sum(Q_distances, 1)[:, None]
                 Q = 1 - Q_distances
 
-        # define matrix clustering
-        S = Q.copy()
+        # define matrix clustering, column-major as in initialize_clustering
+        S = np.array(Q, order='F')
         cluster_index = np.argmax(Q[index_positives], axis=1)
 
         if self.adaptive_clustering_per_label[idx_outside_polytope]:
@@ -564,23 +745,27 @@ class UCSL_C(BaseEM, ClassifierMixin):
             consensus = self.n_consensus + 1
             best_cluster_consistency = 0
 
+        # argmax of the positive samples clustering at the previous iteration, recomputed only when S is re-initialized
+        previous_cluster_index = None
         for iteration in range(self.n_iterations):
             # check for degenerate clustering for positive labels (warning) and negatives (might be normal)
-            for cluster in range(self.n_clusters_per_label[idx_outside_polytope]):
-                if np.count_nonzero(S[index_positives, cluster]) == 0:
-                    logging.debug(
-                        "Cluster dropped, one cluster have no positive points anymore, in iteration : %d" % (
-                                iteration - 1))
-                    logging.debug("Re-initialization of the clustering...")
-                    S, cluster_index, n_clusters = self.initialize_clustering(X, y_polytope, index_positives,
-                                                                              index_negatives,
-                                                                              n_clusters, idx_outside_polytope)
-                if np.max(S[index_negatives, cluster]) < 0.5:
-                    logging.debug(
-                        "Cluster too far, one cluster have no negative points anymore, in consensus : %d" % (
-                                iteration - 1))
-                    logging.debug("Re-distribution of this cluster negative weight to 'all'...")
-                    S[index_negatives, cluster] = 1 / n_clusters
+            n_checked_clusters = self.n_clusters_per_label[idx_outside_polytope]
+            if np.any(np.count_nonzero(S[index_positives, :n_checked_clusters], 0) == 0):
+                logging.debug(
+                    "Cluster dropped, one cluster have no positive points anymore, in iteration : %d" % (
+                            iteration - 1))
+                logging.debug("Re-initialization of the clustering...")
+                S, cluster_index, n_clusters = self.initialize_clustering(X, y_polytope, index_positives,
+                                                                          index_negatives,
+                                                                          n_clusters, idx_outside_polytope)
+                previous_cluster_index = None
+            far_clusters = np.flatnonzero(np.max(S[index_negatives, :n_checked_clusters], 0) < 0.5)
+            if len(far_clusters) > 0:
+                logging.debug(
+                    "Cluster too far, one cluster have no negative points anymore, in consensus : %d" % (
+                            iteration - 1))
+                logging.debug("Re-distribution of this cluster negative weight to 'all'...")
+                S[np.ix_(index_negatives, far_clusters)] = 1 / n_clusters
 
             # re-init directions for each clusters
             self.coefficients[idx_outside_polytope] = {cluster_i: [] for cluster_i in range(n_clusters)}
@@ -588,47 +773,72 @@ class UCSL_C(BaseEM, ClassifierMixin):
             # differentiate one_vs_one and one_vs_rest case
             if self.multiclass_config == 'one_vs_one':
                 for label in [label for label in range(self.n_labels) if label != idx_outside_polytope]:
-                    index_polytope = np.array([i for (i, y_i) in enumerate(y) if y_i in [label, idx_outside_polytope]])
-                    S_polytope = S.copy()[index_polytope]
-                    X_polytope = X.copy()[index_polytope]
-                    y_polytope = y.copy()[index_polytope]
-                    # if label is inside of the polytope, the distance is negative and the label is not divided into
-                    y_polytope[y_polytope == label] = -1
+                    index_polytope = np.flatnonzero((y == label) | (y == idx_outside_polytope))
+                    # gather the rows of S straight into a column-major buffer (the indexes are valid, no need to check them)
+                    S_polytope = np.empty((len(index_polytope), S.shape[1]), order='F')
+                    np.take(S, index_polytope, axis=0, out=S_polytope, mode='clip')
+                    X_polytope = X[index_polytope]
                     # if label is outside of the polytope, the distance is positive and the label is clustered
-                    y_polytope[y_polytope == idx_outside_polytope] = 1
+                    # if label is inside of the polytope, the distance is negative and the label is not divided into
+                    y_polytope = np.where(y[index_polytope] == idx_outside_polytope, 1, -1).astype(np.int8)
                     self.maximization_step(X_polytope, y_polytope, S_polytope, idx_outside_polytope, n_clusters, iteration)
             else:
                 self.maximization_step(X, y_polytope, S, idx_outside_polytope, n_clusters, iteration)
+            self.stack_hyperplanes(idx_outside_polytope, n_clusters)
 
             # decide the convergence based on the clustering stability
-            S_hold = S.copy()
+            if previous_cluster_index is None:
+                previous_cluster_index = np.argmax(S[index_positives], 1)
             S, cluster_index, n_clusters = self.expectation_step(X, S, index_positives, idx_outside_polytope, n_clusters, consensus)
 
             # applying the negative weighting set as input
-            if self.negative_weighting in ['all']:
-                S[index_negatives] = 1 / n_clusters
-            elif self.negative_weighting in ['hard_clustering']:
-                S[index_negatives] = np.rint(S[index_negatives])
-            if self.positive_weighting in ['hard_clustering']:
-                S[index_positives] = np.rint(S[index_positives])
+            self.apply_weighting(S, index_positives, index_negatives, n_clusters)
 
             # TODO : get rid of
             self.S_lists[idx_outside_polytope][iteration + 1] = S.copy()
 
             # check the Clustering Stability \w Adjusted Rand Index for stopping criteria
-            cluster_consistency = ARI(np.argmax(S[index_positives], 1), np.argmax(S_hold[index_positives], 1))
+            current_cluster_index = np.argmax(S[index_positives], 1)
+            cluster_consistency = adjusted_rand_index(current_cluster_index, previous_cluster_index)
+            previous_cluster_index = current_cluster_index
             #print(cluster_consistency)
             if cluster_consistency > best_cluster_consistency :
                 best_cluster_consistency = cluster_consistency
-                self.coefficients[idx_outside_polytope][-1] = copy.deepcopy(self.coefficients[idx_outside_polytope])
-                self.intercepts[idx_outside_polytope][-1] = copy.deepcopy(self.intercepts[idx_outside_polytope])
-                self.orthonormal_basis[idx_outside_polytope][-1] = copy.deepcopy(self.orthonormal_basis[idx_outside_polytope][consensus])
-                self.clustering_method[idx_outside_polytope][-1] = copy.deepcopy(self.clustering_method[idx_outside_polytope][consensus])
+                # only the arrays are copied, the fitted basis and clustering method are never modified in place
+                self.coefficients[idx_outside_polytope][-1] = {cluster_i: [coefficient.copy() for coefficient in coefficients]
+                                                               for cluster_i, coefficients in self.coefficients[idx_outside_polytope].items()}
+                self.intercepts[idx_outside_polytope][-1] = {cluster_i: intercept.copy()
+                                                             for cluster_i, intercept in self.intercepts[idx_outside_polytope].items()}
+                self.orthonormal_basis[idx_outside_polytope][-1] = self.orthonormal_basis[idx_outside_polytope][consensus]
+                self.clustering_method[idx_outside_polytope][-1] = self.clustering_method[idx_outside_polytope][consensus]
             if cluster_consistency > stability_threshold:
                 break
         #print('')
         return cluster_index
 
+    def project_on_basis(self, X, idx_outside_polytope, consensus):
+        """Project samples on the orthonormal basis of a consensus run, reusing the last projection if possible.
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+            Training vectors.
+        idx_outside_polytope : int
+            label that is being clustered
+        consensus : int
+            index of consensus
+        Returns
+        -------
+        X_proj : array-like, shape (n_samples, n_basis_directions)
+            Projected samples.
+        """
+        basis = self.orthonormal_basis[idx_outside_polytope][consensus]
+        cached_X, cached_basis, X_proj = self.projection_cache.get(consensus, (None, None, None))
+        # the bases are replaced, never modified in place, so identity is enough to validate the cache
+        if cached_X is not X or cached_basis is not basis:
+            X_proj = X @ basis.T
+            self.projection_cache[consensus] = (X, basis, X_proj)
+        return X_proj
+
     def predict_clusters_proba_from_cluster_labels(self, X, idx_outside_polytope, n_clusters):
         """Predict positive and negative points clustering probabilities.
         Parameters
@@ -646,7 +856,8 @@ class UCSL_C(BaseEM, ClassifierMixin):
         """
         X_clustering_assignments = np.zeros((len(X), self.n_consensus))
         for consensus in range(self.n_consensus):
-            X_proj = X @ self.orthonormal_basis[idx_outside_polytope][consensus].T
+            # the projections computed in the last expectation step of each consensus run are reused
+            X_proj = self.project_on_basis(X, idx_outside_polytope, consensus)
             if self.clustering in ['k_means', 'gaussian_mixture']:
                 X_clustering_assignments[:, consensus] = self.clustering_method[idx_outside_polytope][consensus].predict(X_proj)
             elif self.clustering in ['custom']:
@@ -654,12 +865,12 @@ class UCSL_C(BaseEM, ClassifierMixin):
         similarity_matrix = compute_similarity_matrix(self.clustering_assignments[idx_outside_polytope],
                                                       clustering_assignments_to_pred=X_clustering_assignments)
 
-        Q = np.zeros((len(X), n_clusters))
         y_clusters_train_ = self.cluster_labels_[idx_outside_polytope]
-        for cluster in range(n_clusters):
-            Q[:, cluster] = np.mean(similarity_matrix[y_clusters_train_ == cluster], 0)
+        # average the similarities of each cluster members with one product against the one-hot cluster assignment
+        cluster_assignment = one_hot_encode(y_clusters_train_, n_classes=n_clusters)
+        Q = (similarity_matrix.T @ cluster_assignment) / np.sum(cluster_assignment, 0)[None, :]
         Q /= np.sum(Q, 1)[:, None]
-        return Q
+        return np.asfortranarray(Q)
 
     def clustering_bagging(self, X, y, y_polytope, index_positives, index_negatives, idx_outside_polytope, n_clusters):
         """Perform a bagging of the previously obtained clustering and compute new hyperplanes.
@@ -685,42 +896,41 @@ class UCSL_C(BaseEM, ClassifierMixin):
         """
         # perform consensus clustering
         consensus_cluster_index = compute_spectral_clustering_consensus(
-            self.clustering_assignments[idx_outside_polytope], n_clusters)
+            self.clustering_assignments[idx_outside_polytope], n_clusters, random_state=self.random_state_)
         # save clustering predictions computed by bagging step
         self.cluster_labels_[idx_outside_polytope] = consensus_cluster_index
 
         if self.clustering == 'HYDRA':
             # initialize the consensus clustering vector
-            S = np.ones((len(X), n_clusters)) / n_clusters
-            S[index_positives] *= 0
+            S = np.ones((len(X), n_clusters), order='F') / n_clusters
+            S[index_positives] = 0
             S[index_positives, consensus_cluster_index] = 1
 
-            for cluster in range(n_clusters):
-                cluster_assignment = np.ascontiguousarray(S[:, cluster])
-                SVM_coefficient, SVM_intercept = launch_svc(X, y_polytope, cluster_assignment, C=self.C)
+            # one seed per cluster, the fits run in separate processes as in the maximization step
+            seeds = self.random_state_.randint(np.iinfo(np.int32).max, size=n_clusters)
+            SVM_results = Parallel(n_jobs=self.n_jobs, backend="loky")(
+                delayed(launch_svc)(X, y_polytope, S[:, cluster], C=self.C, random_state=seeds[cluster])
+                for cluster in range(n_clusters))
+            for cluster, (SVM_coefficient, SVM_intercept) in enumerate(SVM_results):
                 self.coefficients[idx_outside_polytope][cluster] = SVM_coefficient
                 self.intercepts[idx_outside_polytope][cluster] = SVM_intercept
 
                 # TODO: get rid of
-                self.coefficient_lists[idx_outside_polytope][cluster][-1] = SVM_coefficient.copy()
-                self.intercept_lists[idx_outside_polytope][cluster][-1] = SVM_intercept.copy()
+                self.coefficient_history[idx_outside_polytope][-1, cluster] = SVM_coefficient[0]
+                self.intercept_history[idx_outside_polytope][-1, cluster] = SVM_intercept[0]
+            self.stack_hyperplanes(idx_outside_polytope, n_clusters)
 
         else:
             # update clustering matrix S
             S = self.predict_clusters_proba_from_cluster_labels(X, idx_outside_polytope, n_clusters)
-            if self.negative_weighting in ['all']:
-                S[index_negatives] = 1 / n_clusters
-            elif self.negative_weighting in ['hard_clustering']:
-                S[index_negatives] = np.rint(S[index_negatives])
-            if self.positive_weighting in ['hard_clustering']:
-                S[index_positives] = np.rint(S[index_positives])
+            self.apply_weighting(S, index_positives, index_negatives, n_clusters)
 
             cluster_index = self.run_EM(X, y, y_polytope, S, consensus_cluster_index, index_positives, index_negatives,
                                         idx_outside_polytope, n_clusters, 0.9, -1)
 
             # save barycenters and final predictions
             self.cluster_labels_[idx_outside_polytope] = cluster_index
-            X_proj = X @ self.orthonormal_basis[idx_outside_polytope][-1].T
-            self.barycenters[idx_outside_polytope] = [
-                np.mean(X_proj[index_positives][cluster_index == cluster], 0)[None, :] for cluster in
-                range(np.max(cluster_index) + 1)]
+            X_proj_positives = X[index_positives] @ self.orthonormal_basis[idx_outside_polytope][-1].T
+            cluster_assignment = one_hot_encode(cluster_index)
+            self.barycenters[idx_outside_polytope] = (cluster_assignment.T @ X_proj_positives) / \
+                np.sum(cluster_assignment, 0)[:, None]
@@ -1,9 +1,11 @@
 import copy
 import logging
 
+from joblib import Parallel, delayed, effective_n_jobs
+from scipy.spatial.distance import cdist
 from sklearn.base import RegressorMixin
-from sklearn.metrics import adjusted_rand_score as ARI
 from sklearn.mixture import GaussianMixture
+from sklearn.utils import check_random_state
 
 from ucsl.base import *
 from ucsl.utils import *
@@ -34,12 +36,19 @@ class UCSL_R(BaseEM, RegressorMixin):
         It must be one of "soft_clustering", "hard_clustering".
         ie : the importance of non-clustered label in the maximization computation
         If not specified, ucsl original "all" will be used.
+    n_jobs : int, optional (default=None)
+        Number of jobs used to run the consensus runs and to fit the hyperplanes of the different clusters in parallel,
+        If not specified, they are run one after the other.
+    random_state : int, RandomState instance or None, optional (default=None)
+        Seed of the random number generator used by the initializations and clusterings,
+        If not specified, the global numpy random number generator will be used.
     """
 
     def __init__(self, stability_threshold=0.95, noise_tolerance_threshold=10, C=1, n_consensus=10, n_iterations=10,
                  initialization="gaussian_mixture", clustering='gaussian_mixture', consensus='spectral_clustering',
                  maximization='svr', custom_clustering_method=None, custom_maximization_method=None, n_clusters=2,
-                 weighting='soft_clustering', custom_initialization_matrixes=None, covariance_type='full'):
+                 weighting='soft_clustering', custom_initialization_matrixes=None, covariance_type='full', n_jobs=None,
+                 random_state=None):
 
         super().__init__(initialization=initialization, clustering=clustering, consensus=consensus, maximization=maximization,
                          stability_threshold=stability_threshold, noise_tolerance_threshold=noise_tolerance_threshold,
@@ -51,6 +60,9 @@ class UCSL_R(BaseEM, RegressorMixin):
         # define C hyper-parameter if the classification method is max-margin
         self.C = C
         self.covariance_type=covariance_type
+        self.n_jobs = n_jobs
+        self.maximization_n_jobs = n_jobs
+        self.random_state = random_state
 
         # define what are the weightings we want=
         assert (weighting in ['hard_clustering', 'soft_clustering']), \
@@ -68,6 +80,9 @@ class UCSL_R(BaseEM, RegressorMixin):
         # store directions from the Maximization method and store intercepts (only useful for ucsl)
         self.coefficients = {cluster_i: [] for cluster_i in range(self.n_clusters)}
         self.intercepts = {cluster_i: [] for cluster_i in range(self.n_clusters)}
+        # same directions and intercepts stacked in a (n_clusters, n_features) matrix and a (n_clusters,) vector
+        self.stacked_coefficients = None
+        self.stacked_intercepts = None
 
         # store intermediate and consensus results in dictionaries
         self.cluster_labels_ = None
@@ -91,6 +106,8 @@ class UCSL_R(BaseEM, RegressorMixin):
         -------
         self
         """
+        self.random_state_ = check_random_state(self.random_state)
+
         # cluster each label one by one and confine the other inside the polytope
         self.run(X_train, y_train, self.n_clusters)
         return self
@@ -112,7 +129,8 @@ class UCSL_R(BaseEM, RegressorMixin):
             predictions_per_clusters = self.compute_predictions_per_clusters(X)
             # compute the predictions \w.r.t cluster previously found
             cluster_predictions = self.predict_clusters(X)
-            y_pred = sum([cluster_predictions[:, cluster] * predictions_per_clusters[:, cluster] for cluster in range(self.n_clusters)])
+            y_pred = np.einsum('nc,nc->n', cluster_predictions[:, :self.n_clusters],
+                               predictions_per_clusters[:, :self.n_clusters])
 
         return y_pred
 
@@ -127,14 +145,21 @@ class UCSL_R(BaseEM, RegressorMixin):
         SVM_distances : dict of array, length (n_labels) , shape of element (n_samples, n_clusters[label])
             Predictions of the point/hyperplane margin for each cluster of each label.
         """
-        # first compute points distances to hyperplane
-        SVM_predictions = np.zeros((len(X), self.n_clusters))
+        # all the clusters hyperplanes are applied with a single product
+        return X @ self.stacked_coefficients.T + self.stacked_intercepts
 
-        for cluster_i in range(self.n_clusters):
-            SVM_coefficient = self.coefficients[cluster_i]
-            SVM_intercept = self.intercepts[cluster_i]
-            SVM_predictions[:, cluster_i] = X @ SVM_coefficient[0] + SVM_intercept[0]
-        return SVM_predictions
+    def stack_hyperplanes(self, n_clusters):
+        """Stack the directions and intercepts so that all the hyperplanes are applied with one product.
+        Parameters
+        ----------
+        n_clusters : int
+            number of clusters
+        Returns
+        -------
+        None
+        """
+        self.stacked_coefficients = np.array([self.coefficients[cluster][0] for cluster in range(n_clusters)])
+        self.stacked_intercepts = np.array([self.intercepts[cluster][0] for cluster in range(n_clusters)])
 
     def predict_clusters(self, X):
         """Predict clustering for each label in a hierarchical manner.
@@ -153,16 +178,15 @@ class UCSL_R(BaseEM, RegressorMixin):
             if self.n_clusters > 1:
                 X_proj = X @ self.orthonormal_basis[-1].T
                 if self.clustering == 'k_means':
-                    cluster_predictions = one_hot_encode(self.clustering_method[-1].predict(X_proj).astype(np.int), n_classes=self.n_clusters)
+                    cluster_predictions = one_hot_encode(self.clustering_method[-1].predict(X_proj), n_classes=self.n_clusters)
                 elif self.clustering == 'gaussian_mixture':
-                    cluster_predictions = self.clustering_method[-1].predict_proba(X_proj)
+                    cluster_predictions = gaussian_mixture_proba(self.clustering_method[-1], X_proj)
                 elif self.clustering == 'custom':
-                    Q_distances = np.zeros((len(X_proj), len(self.barycenters)))
-                    for cluster in range(len(self.barycenters)):
-                        if X_proj.shape[1] > 1:
-                            Q_distances[:, cluster] = np.sum(np.abs(X_proj - self.barycenters[cluster]), 1)
-                        else:
-                            Q_distances[:, cluster] = (X_proj - self.barycenters[cluster][None, :])[:, 0]
+                    # distances to all the barycenters at once, without a (n_samples, basis_dim) temporary per cluster
+                    if X_proj.shape[1] > 1:
+                        Q_distances = cdist(X_proj, self.barycenters, metric='cityblock')
+                    else:
+                        Q_distances = X_proj - self.barycenters.T
                     Q_distances /= np.sum(Q_distances, 1)[:, None]
                     cluster_predictions = 1 - Q_distances
             else:
@@ -175,26 +199,96 @@ class UCSL_R(BaseEM, RegressorMixin):
             SVM_coefficient, SVM_intercept = launch_svr(X, y, C=self.C)
             self.coefficients[0] = SVM_coefficient
             self.intercepts[0] = SVM_intercept
+            self.stack_hyperplanes(n_clusters)
             n_consensus = 0
         else:
             n_consensus = self.n_consensus
             # define the clustering assignment matrix (each column correspond to one consensus run)
             self.clustering_assignments = np.zeros((len(y), n_consensus))
 
-        for consensus in range(n_consensus):
-            # first we initialize the clustering matrix S, with the initialization strategy set in self.initialization
-            S, cluster_index, n_clusters = self.initialize_clustering(X, y, n_clusters)
-            if self.weighting in ['hard_clustering']:
-                S = np.rint(S)
-
-            cluster_index = self.run_EM(X, y, S, cluster_index, n_clusters, self.stability_threshold, consensus)
+        # the consensus runs are independent, each one is seeded so that the result does not depend on n_jobs
+        seeds = self.random_state_.randint(np.iinfo(np.int32).max, size=n_consensus + 1)
+        # when the consensus runs are spread over several workers, the hyperplanes of each run are fitted sequentially
+        # so that the workers do not oversubscribe the CPU
+        maximization_n_jobs = 1 if n_consensus > 1 and effective_n_jobs(self.n_jobs) > 1 else self.n_jobs
+        consensus_results = Parallel(n_jobs=self.n_jobs)(
+            delayed(self.run_consensus)(X, y, n_clusters, consensus, seeds[consensus], maximization_n_jobs)
+            for consensus in range(n_consensus))
 
+        for consensus, (cluster_index, n_clusters, basis, clustering_method, state) in enumerate(consensus_results):
             # update the cluster index for the consensus clustering
             self.clustering_assignments[:, consensus] = cluster_index
+            self.orthonormal_basis[consensus] = basis
+            self.clustering_method[consensus] = clustering_method
+        if n_consensus > 0:
+            # as with sequential runs, the hyperplanes are the ones left by the last consensus run
+            self.coefficients = state['coefficients']
+            self.intercepts = state['intercepts']
+            self.stacked_coefficients = state['stacked_coefficients']
+            self.stacked_intercepts = state['stacked_intercepts']
+            # the last basis and clustering method are only set by some of the clustering methods
+            if state['last_basis'] is not None:
+                self.orthonormal_basis[-1] = state['last_basis']
+            if state['last_clustering_method'] is not None:
+                self.clustering_method[-1] = state['last_clustering_method']
+            # the runs may have consumed the random state in other processes, the bagging step gets its own seed
+            self.random_state_ = np.random.RandomState(seeds[-1])
 
         if n_consensus > 1:
             self.clustering_bagging(X, y, n_clusters)
 
+    def run_consensus(self, X, y, n_clusters, consensus, seed, maximization_n_jobs=None):
+        """Perform one consensus run : initialize the clustering and run the EM algorithm until convergence.
+        The run works on a copy of the estimator, which is left unchanged.
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+            Training vectors.
+        y : array-like, shape (n_samples,)
+            Target values.
+        n_clusters : int
+            number of clusters
+        consensus : int
+            index of consensus
+        seed : int
+            seed of the random number generator used by this consensus run
+        maximization_n_jobs : int, optional (default=None)
+            number of jobs used to fit the hyperplanes of the different clusters during this consensus run
+        Returns
+        -------
+        cluster_index : array-like, shape (n_samples, )
+            clusters predictions argmax for the samples.
+        n_clusters : int
+            number of clusters
+        basis : array-like, shape (n_basis_directions, n_features)
+            orthonormal basis found by the consensus run
+        clustering_method : estimator
+            clustering method fitted by the consensus run
+        state : dict
+            hyperplanes, stacked hyperplanes, last basis and clustering method, as left by the consensus run
+        """
+        # the run works on its own copy of the estimator, so that it shares no state with the other runs
+        # whatever the joblib backend, and it gets its own random state
+        estimator = copy.deepcopy(self)
+        estimator.random_state_ = np.random.RandomState(seed)
+        estimator.maximization_n_jobs = maximization_n_jobs
+
+        # first we initialize the clustering matrix S, with the initialization strategy set in self.initialization
+        S, cluster_index, n_clusters = estimator.initialize_clustering(X, y, n_clusters)
+        if estimator.weighting in ['hard_clustering']:
+            S = np.rint(S)
+
+        cluster_index = estimator.run_EM(X, y, S, cluster_index, n_clusters, estimator.stability_threshold, consensus)
+
+        state = {'coefficients': estimator.coefficients,
+                 'intercepts': estimator.intercepts,
+                 'stacked_coefficients': estimator.stacked_coefficients,
+                 'stacked_intercepts': estimator.stacked_intercepts,
+                 'last_basis': estimator.orthonormal_basis.get(-1),
+                 'last_clustering_method': estimator.clustering_method.get(-1)}
+        return (cluster_index, n_clusters, estimator.orthonormal_basis[consensus],
+                estimator.clustering_method[consensus], state)
+
     def initialize_clustering(self, X, y_polytope, n_clusters):
         """Perform a bagging of the previously obtained clusterings and compute new hyperplanes.
         Parameters
@@ -213,11 +307,11 @@ class UCSL_R(BaseEM, RegressorMixin):
         S = np.ones((len(y_polytope), n_clusters)) / n_clusters
 
         if self.initialization in ["k_means"]:
-            KM = KMeans(n_clusters=self.n_clusters, n_init=1).fit(X)
+            KM = KMeans(n_clusters=self.n_clusters, n_init=1, random_state=self.random_state_).fit(X)
             S = one_hot_encode(KM.predict(X))
 
         if self.initialization in ["gaussian_mixture"]:
-            GMM = GaussianMixture(n_components=self.n_clusters, n_init=1).fit(X)
+            GMM = GaussianMixture(n_components=self.n_clusters, n_init=1, random_state=self.random_state_).fit(X)
             S = GMM.predict_proba(X)
 
         if self.initialization in ['custom']:
@@ -227,6 +321,8 @@ class UCSL_R(BaseEM, RegressorMixin):
         if self.initialization == "precomputed":
             S = self.custom_initialization_matrixes
 
+        # S is kept column-major so that the cluster weightings used by the maximization step are contiguous
+        S = np.asfortranarray(S)
         cluster_index = np.argmax(S, axis=1)
 
         if self.adaptive_clustering :
@@ -236,17 +332,19 @@ class UCSL_R(BaseEM, RegressorMixin):
 
     def maximization_step(self, X, y, S, n_clusters, iteration):
         if self.maximization == "logistic":
-            for cluster in range(n_clusters):
-                cluster_assignment = np.ascontiguousarray(S[:, cluster])
-                logistic_coefficient, logistic_intercept = launch_logistic(X, y, cluster_assignment)
-                self.coefficients[cluster].extend(logistic_coefficient)
-                self.intercepts[cluster] = logistic_intercept
-        if self.maximization == "svr":
-            for cluster in range(n_clusters):
-                cluster_assignment = np.ascontiguousarray(S[:, cluster])
-                logistic_coefficient, logistic_intercept = launch_svr(X, y, cluster_assignment)
-                self.coefficients[cluster].extend(logistic_coefficient)
-                self.intercepts[cluster] = logistic_intercept
+            launch_method = launch_logistic
+        elif self.maximization == "svr":
+            launch_method = launch_svr
+        else:
+            return
+        # the hyperplanes of the different clusters are independent, libsvm releases the GIL during the SVR fits
+        # while the lbfgs logistic regressions only release it in their numpy products (partial speedup)
+        results = Parallel(n_jobs=self.maximization_n_jobs, prefer="threads")(
+            delayed(launch_method)(X, y, S[:, cluster]) for cluster in range(n_clusters))
+        for cluster, (coefficient, intercept) in enumerate(results):
+            self.coefficients[cluster].extend(coefficient)
+            self.intercepts[cluster] = intercept
+        self.stack_hyperplanes(n_clusters)
 
     def expectation_step(self, X, S, n_clusters, consensus):
         """Update clustering method (update clustering distribution matrix S).
@@ -270,70 +368,42 @@ class UCSL_R(BaseEM, RegressorMixin):
         """
         Q = S.copy()
         if self.clustering == 'ucsl':
-            SVM_distances = np.zeros(S.shape)
-            for cluster in range(n_clusters):
-                # Apply the data again the trained model to get the final SVM scores
-                SVM_coefficient = self.coefficients[cluster]
-                SVM_intercept = self.intercepts[cluster]
-                SVM_distances[:, cluster] = X @ SVM_coefficient[0] + SVM_intercept[0]
+            # Apply the data again the trained model to get the final SVM scores
+            SVM_distances = self.compute_predictions_per_clusters(X)
 
-            SVM_distances -= np.min(SVM_distances)
-            SVM_distances += 1e-3
-            Q = SVM_distances / np.sum(SVM_distances, 1)[:, None]
+            Q = svm_scores_to_cluster_proba(SVM_distances)
 
         if self.clustering in ['k_means', 'gaussian_mixture', 'custom']:
             # get directions
-            directions = []
-            for cluster in range(n_clusters):
-                directions.extend(self.coefficients[cluster])
-            norm_directions = [np.linalg.norm(direction) for direction in directions]
-            directions = np.array(directions) / np.array(norm_directions)[:, None]
-
-            # compute the most important vectors because Graam-Schmidt is not invariant by permutation when the matrix is not square
-            scores = []
-            for i, direction_i in enumerate(directions):
-                scores_i = []
-                for j, direction_j in enumerate(directions):
-                    if i != j:
-                        scores_i.append(np.linalg.norm(direction_i - (np.dot(direction_i, direction_j) * direction_j)))
-                scores.append(np.mean(scores_i))
-            directions = directions[np.array(scores).argsort()[::-1], :]
-
-            # orthonormalize coefficient/direction basis
-            basis = []
-            for v in directions:
-                w = v - np.sum(np.dot(v, b) * b for b in basis)
-                if len(basis) >= 2:
-                    if np.linalg.norm(w) * self.noise_tolerance_threshold > 1:
-                        basis.append(w / np.linalg.norm(w))
-                elif np.linalg.norm(w) > 1e-2:
-                    basis.append(w / np.linalg.norm(w))
-
-            self.orthonormal_basis[consensus] = np.array(basis)
-            self.orthonormal_basis[-1] = np.array(basis).copy()
+            directions = normalized_directions(self.coefficients, n_clusters)
+
+            basis = graam_schmidt(directions, self.noise_tolerance_threshold)
+            self.orthonormal_basis[consensus] = basis
+            self.orthonormal_basis[-1] = basis
             X_proj = X @ self.orthonormal_basis[consensus].T
 
-            centroids = [np.mean(S[:, cluster][:, None] * X_proj, 0) for cluster in range(n_clusters)]
+            # weighted means of the samples for all the clusters at once
+            centroids = S.T @ X_proj / len(X_proj)
 
             if self.clustering == 'k_means':
                 self.clustering_method[consensus] = KMeans(
-                    n_clusters=n_clusters, init=np.array(centroids), n_init=1).fit(X_proj)
+                    n_clusters=n_clusters, init=centroids, n_init=1, random_state=self.random_state_).fit(X_proj)
                 Q = one_hot_encode(self.clustering_method[consensus].predict(X_proj), n_classes=n_clusters)
-                self.clustering_method[-1] = copy.deepcopy(
-                    self.clustering_method[consensus])
+                self.clustering_method[-1] = self.clustering_method[consensus]
 
             if self.clustering == 'gaussian_mixture':
                 self.clustering_method[consensus] = GaussianMixture(
-                    n_components=n_clusters, covariance_type=self.covariance_type, means_init=np.array(centroids)).fit(X_proj)
-                Q = self.clustering_method[consensus].predict_proba(X_proj)
-                self.clustering_method[-1] = copy.deepcopy(self.clustering_method[consensus])
+                    n_components=n_clusters, covariance_type=self.covariance_type, means_init=centroids,
+                    random_state=self.random_state_).fit(X_proj)
+                Q = gaussian_mixture_proba(self.clustering_method[consensus], X_proj)
+                self.clustering_method[-1] = self.clustering_method[consensus]
 
             if self.clustering in ['custom']:
                 self.clustering_method[consensus] = copy.deepcopy(self.custom_clustering_method)
                 Q = one_hot_encode(self.clustering_method[consensus].fit_predict(X_proj), n_clusters)
 
-        # define matrix clustering
-        S = Q.copy()
+        # define matrix clustering, column-major as in initialize_clustering
+        S = np.array(Q, order='F')
         cluster_index = np.argmax(Q, axis=1)
 
         if self.adaptive_clustering :
@@ -364,13 +434,15 @@ class UCSL_R(BaseEM, RegressorMixin):
         S : array-like, shape (n_samples, n_samples)
             Cluster prediction matrix.
         """
+        # argmax of the clustering at the previous iteration, recomputed only when S is re-initialized
+        previous_cluster_index = None
         for iteration in range(self.n_iterations):
             # check for degenerate clustering for positive labels (warning) and negatives (might be normal)
-            for cluster in range(self.n_clusters):
-                if np.count_nonzero(S[:, cluster]) == 0:
-                    logging.debug("Cluster dropped, one cluster have no positive points anymore, in iteration : %d" % (iteration - 1))
-                    logging.debug("Re-initialization of the clustering...")
-                    S, cluster_index, n_clusters = self.initialize_clustering(X, y, n_clusters)
+            if np.any(np.count_nonzero(S[:, :self.n_clusters], 0) == 0):
+                logging.debug("Cluster dropped, one cluster have no positive points anymore, in iteration : %d" % (iteration - 1))
+                logging.debug("Re-initialization of the clustering...")
+                S, cluster_index, n_clusters = self.initialize_clustering(X, y, n_clusters)
+                previous_cluster_index = None
 
             # re-init directions for each clusters
             self.coefficients = {cluster_i: [] for cluster_i in range(n_clusters)}
@@ -380,15 +452,18 @@ class UCSL_R(BaseEM, RegressorMixin):
             self.maximization_step(X, y, S, n_clusters, iteration)
 
             # decide the convergence based on the clustering stability
-            S_hold = S.copy()
+            if previous_cluster_index is None:
+                previous_cluster_index = np.argmax(S, 1)
             S, cluster_index, n_clusters = self.expectation_step(X, S, n_clusters, consensus)
 
             # applying the weighting set as input
             if self.weighting in ['hard_clustering']:
-                S = np.rint(S)
+                np.rint(S, out=S)
 
             # check the Clustering Stability \w Adjusted Rand Index for stopping criteria
-            cluster_consistency = ARI(np.argmax(S, 1), np.argmax(S_hold, 1))
+            current_cluster_index = np.argmax(S, 1)
+            cluster_consistency = adjusted_rand_index(current_cluster_index, previous_cluster_index)
+            previous_cluster_index = current_cluster_index
             if cluster_consistency > stability_threshold:
                 break
         return cluster_index
@@ -409,20 +484,21 @@ class UCSL_R(BaseEM, RegressorMixin):
             Cluster prediction matrix.
         """
         X_clustering_assignments = np.zeros((len(X), self.n_consensus))
-        for consensus in range(self.n_consensus):
-            X_proj = X @ self.orthonormal_basis[consensus].T
+        # the samples are projected on all the consensus bases at once
+        X_projs = project_on_bases(X, [self.orthonormal_basis[consensus] for consensus in range(self.n_consensus)])
+        for consensus, X_proj in enumerate(X_projs):
             if self.clustering in ['k_means', 'gaussian_mixture']:
                 X_clustering_assignments[:, consensus] = self.clustering_method[consensus].predict(X_proj)
             elif self.clustering in ['custom']:
                 X_clustering_assignments[:, consensus] = self.clustering_method[consensus].fit_predict(X_proj)
         similarity_matrix = compute_similarity_matrix(self.clustering_assignments, clustering_assignments_to_pred=X_clustering_assignments)
 
-        Q = np.zeros((len(X), n_clusters))
         y_clusters_train_ = self.cluster_labels_
-        for cluster in range(n_clusters):
-            Q[:, cluster] = np.mean(similarity_matrix[y_clusters_train_ == cluster], 0)
+        # average the similarities of each cluster members with one product against the one-hot cluster assignment
+        cluster_assignment = one_hot_encode(y_clusters_train_, n_classes=n_clusters)
+        Q = (similarity_matrix.T @ cluster_assignment) / np.sum(cluster_assignment, 0)[None, :]
         Q /= np.sum(Q, 1)[:, None]
-        return Q
+        return np.asfortranarray(Q)
 
     def clustering_bagging(self, X, y, n_clusters):
         """Perform a bagging of the previously obtained clustering and compute new hyperplanes.
@@ -439,7 +515,8 @@ class UCSL_R(BaseEM, RegressorMixin):
         None
         """
         # perform consensus clustering
-        consensus_cluster_index = compute_spectral_clustering_consensus(self.clustering_assignments, n_clusters)
+        consensus_cluster_index = compute_spectral_clustering_consensus(self.clustering_assignments, n_clusters,
+                                                                       random_state=self.random_state_)
         # save clustering predictions computed by bagging step
         self.cluster_labels_ = consensus_cluster_index
 
@@ -453,4 +530,5 @@ class UCSL_R(BaseEM, RegressorMixin):
         # save barycenters and final predictions
         self.cluster_labels_ = cluster_index
         X_proj = X @ self.orthonormal_basis[-1].T
-        self.barycenters = [np.mean(X_proj[cluster_index == cluster], 0)[None, :] for cluster in range(np.max(cluster_index) + 1)]
+        cluster_assignment = one_hot_encode(cluster_index)
+        self.barycenters = (cluster_assignment.T @ X_proj) / np.sum(cluster_assignment, 0)[:, None]
@@ -3,17 +3,26 @@ from scipy.special import logsumexp
 from sklearn.cluster import KMeans
 from sklearn.cluster import SpectralClustering
 from sklearn.linear_model import LogisticRegression
-from sklearn.svm import SVC, SVR
+from sklearn.svm import SVC, SVR, LinearSVC
 
 from ucsl.sinkhornknopp_utils import *
 
 
+def project_on_bases(X, bases):
+    """ project X on several bases of possibly different sizes with a single matrix product """
+    X_proj = X @ np.concatenate(bases).T
+    return np.split(X_proj, np.cumsum([len(basis) for basis in bases])[:-1], axis=1)
+
+
 def one_hot_encode(y, n_classes=None):
     ''' utils function in order to turn a label vector into a one hot encoded matrix '''
+    y = np.asarray(y, dtype=np.intp)
     if n_classes is None:
         n_classes = np.max(y) + 1
-    y_one_hot = np.copy(y)
-    return np.eye(n_classes)[y_one_hot]
+    # scatter the ones in a zero matrix, without building and gathering rows of an identity matrix
+    y_one_hot = np.zeros((len(y), n_classes))
+    np.put_along_axis(y_one_hot, y[:, None], 1, axis=1)
+    return y_one_hot
 
 
 def sigmoid(x, lambda_=5):
@@ -25,21 +34,66 @@ def py_softmax(x, axis=None):
     return np.exp(x - logsumexp(x, axis=axis, keepdims=True))
 
 
-def consensus_clustering(clustering_results, n_clusters, index_positives):
-    S = np.ones((clustering_results.shape[0], n_clusters)) / n_clusters
-    co_occurrence_matrix = np.zeros((clustering_results.shape[0], clustering_results.shape[0]))
+def svm_scores_to_cluster_proba(SVM_distances):
+    """ turn SVM scores into clustering conditional probabilities P(cluster=i|y=label), in place """
+    SVM_distances -= np.min(SVM_distances) - 1e-3
+    SVM_distances /= np.sum(SVM_distances, 1, keepdims=True)
+    return SVM_distances
+
+
+def gaussian_mixture_proba(gaussian_mixture, X):
+    """ posterior probabilities of a fitted GaussianMixture, with a closed form E-step for the spherical covariance """
+    if gaussian_mixture.covariance_type != 'spherical':
+        return gaussian_mixture.predict_proba(X)
+    # with precisions = 1 / sigma^2, log N(x|mu, sigma^2) = 0.5 * d * log(precision) - 0.5 * precision * ||x - mu||^2 + cst
+    means, precisions = gaussian_mixture.means_, gaussian_mixture.precisions_
+    squared_distances = np.sum(X ** 2, 1)[:, None] - 2 * X @ means.T + np.sum(means ** 2, 1)[None, :]
+    np.maximum(squared_distances, 0, out=squared_distances)
+    log_resp = np.log(gaussian_mixture.weights_) + 0.5 * X.shape[1] * np.log(precisions) - 0.5 * precisions * squared_distances
+    return py_softmax(log_resp, axis=1)
+
+
+def adjusted_rand_index(labels, other_labels):
+    """ adjusted rand index of two non-negative integer labelings, from a single bincount contingency table """
+    if np.array_equal(labels, other_labels):
+        return 1.0
+    n_samples, n_other_labels = len(labels), np.max(other_labels) + 1
+    contingency = np.bincount(labels * n_other_labels + other_labels,
+                              minlength=(np.max(labels) + 1) * n_other_labels).astype(np.float64)
+    contingency = contingency.reshape(-1, n_other_labels)
+    sum_squares = np.sum(contingency ** 2)
+    # pair confusion matrix, as in sklearn.metrics.adjusted_rand_score
+    true_positives = sum_squares - n_samples
+    false_positives = np.sum(np.sum(contingency, 0) ** 2) - sum_squares
+    false_negatives = np.sum(np.sum(contingency, 1) ** 2) - sum_squares
+    true_negatives = n_samples ** 2 - false_positives - false_negatives - sum_squares
+    if false_negatives == 0 and false_positives == 0:
+        return 1.0
+    return 2. * (true_positives * true_negatives - false_negatives * false_positives) / \
+        ((true_positives + false_negatives) * (false_negatives + true_negatives) +
+         (true_positives + false_positives) * (false_positives + true_negatives))
+
+
+def count_co_occurrences(clustering_results, other_clustering_results, weights=None):
+    """ count, for each pair of samples, the (weighted) number of clustering runs putting them in the same cluster """
+    co_occurrences = np.zeros((len(clustering_results), len(other_clustering_results)))
+    for run in range(clustering_results.shape[1]):
+        weight = 1 if weights is None else weights[run]
+        co_occurrences += weight * (clustering_results[:, run][:, None] == other_clustering_results[:, run][None, :])
+    return co_occurrences
 
-    for i in range(clustering_results.shape[0] - 1):
-        for j in range(i + 1, clustering_results.shape[0]):
-            co_occurrence_matrix[i, j] = sum(clustering_results[i, :] == clustering_results[j, :])
 
-    co_occurrence_matrix = np.add(co_occurrence_matrix, co_occurrence_matrix.transpose())
+def consensus_clustering(clustering_results, n_clusters, index_positives):
+    S = np.ones((clustering_results.shape[0], n_clusters)) / n_clusters
+    co_occurrence_matrix = count_co_occurrences(clustering_results, clustering_results)
+    np.fill_diagonal(co_occurrence_matrix, 0)
     # here is to compute the Laplacian matrix
     Laplacian = np.subtract(np.diag(np.sum(co_occurrence_matrix, axis=1)), co_occurrence_matrix)
 
-    Laplacian_norm = np.subtract(np.eye(clustering_results.shape[0]), np.matmul(
-        np.matmul(np.diag(1 / np.sqrt(np.sum(co_occurrence_matrix, axis=1))), co_occurrence_matrix),
-        np.diag(1 / np.sqrt(np.sum(co_occurrence_matrix, axis=1)))))
+    # scale rows and columns by the inverse square root degrees instead of multiplying by diagonal matrices
+    inv_sqrt_degrees = 1 / np.sqrt(np.sum(co_occurrence_matrix, axis=1))
+    Laplacian_norm = np.subtract(np.eye(clustering_results.shape[0]),
+                                 co_occurrence_matrix * inv_sqrt_degrees[:, None] * inv_sqrt_degrees[None, :])
     # replace the nan with 0
     Laplacian_norm = np.nan_to_num(Laplacian_norm)
 
@@ -55,41 +109,88 @@ def consensus_clustering(clustering_results, n_clusters, index_positives):
 
     # apply clustering method
     k_means = KMeans(n_clusters=n_clusters).fit(spectral_features[index_positives])
-    S[index_positives] = one_hot_encode(k_means.labels_.astype(np.int), n_classes=n_clusters)
+    S[index_positives] = one_hot_encode(k_means.labels_, n_classes=n_clusters)
 
     return S
 
 
 def compute_similarity_matrix(consensus_assignment, clustering_assignments_to_pred=None):
     # compute inter-samples positive/negative co-occurence matrix
-    similarity_matrix = np.zeros((len(consensus_assignment), len(clustering_assignments_to_pred)))
-    for i, p_assignment in enumerate(consensus_assignment):
-        for j, new_point_assignment in enumerate(clustering_assignments_to_pred):
-            similarity_matrix[i, j] = np.sum(p_assignment == new_point_assignment)
+    similarity_matrix = count_co_occurrences(consensus_assignment, clustering_assignments_to_pred)
     similarity_matrix += 1e-3
     similarity_matrix /= np.max(similarity_matrix)
     return similarity_matrix
 
 
-def compute_spectral_clustering_consensus(clustering_results, n_clusters):
+def compute_spectral_clustering_consensus(clustering_results, n_clusters, random_state=None):
     # compute positive samples co-occurence matrix
-    n_positives = len(clustering_results)
-    similarity_matrix = np.zeros((n_positives, n_positives))
-    for i in range(n_positives - 1):
-        for j in range(i + 1, n_positives):
-            similarity_matrix[i, j] = sum(clustering_results[i, :] == clustering_results[j, :])
-    similarity_matrix = np.add(similarity_matrix, similarity_matrix.transpose())
+    similarity_matrix = count_co_occurrences(clustering_results, clustering_results)
+    np.fill_diagonal(similarity_matrix, 0)
     similarity_matrix += 1e-3
     similarity_matrix /= np.max(similarity_matrix)
 
     # initialize spectral clustering method
-    spectral_clustering_method = SpectralClustering(n_clusters=n_clusters, affinity='precomputed')
+    spectral_clustering_method = SpectralClustering(n_clusters=n_clusters, affinity='precomputed', random_state=random_state)
     spectral_clustering_method.fit(similarity_matrix)
 
     return spectral_clustering_method.labels_
 
 
-def launch_svc(X, y, sample_weight=None, kernel='linear', C=1):
+def normalized_directions(coefficients, n_clusters):
+    """ stack the hyperplanes directions of all the clusters in a preallocated matrix, normalized in place """
+    n_directions = sum(len(coefficients[cluster]) for cluster in range(n_clusters))
+    directions = np.empty((n_directions, len(coefficients[0][0])))
+    row = 0
+    for cluster in range(n_clusters):
+        for direction in coefficients[cluster]:
+            directions[row] = direction
+            row += 1
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    return directions
+
+
+def graam_schmidt(directions, noise_tolerance_threshold):
+    """Orthonormalize the directions found by the maximization step.
+    Parameters
+    ----------
+    directions : array-like, shape (n_directions, n_features)
+        Unit norm directions.
+    noise_tolerance_threshold : float
+        once 2 vectors are in the basis, a direction is kept if its residual norm is above 1 / noise_tolerance_threshold
+    Returns
+    -------
+    basis : array-like, shape (n_basis, n_features)
+        Orthonormal basis, starting with the directions the least redundant with the others.
+    """
+    # compute the most important vectors because Graam-Schmidt is not invariant by permutation when the matrix is not square
+    # for unit vectors ||d_i - (d_i.d_j) d_j|| = sqrt(1 - (d_i.d_j)^2), so every score comes from a single Gram matrix
+    gram_matrix = directions @ directions.T
+    residual_norms = np.sqrt(np.clip(1 - gram_matrix ** 2, 0, None))
+    np.fill_diagonal(residual_norms, 0)
+    scores = np.sum(residual_norms, 1) / (len(directions) - 1)
+    directions = directions[scores.argsort()[::-1], :]
+
+    # orthonormalize coefficient/direction basis, the accepted vectors are stacked in the first n_basis rows
+    basis = np.empty_like(directions)
+    n_basis = 0
+    for v in directions:
+        # remove the projection on the current basis with two matrix-vector products, twice for numerical stability
+        w = v - (basis[:n_basis] @ v) @ basis[:n_basis]
+        w -= (basis[:n_basis] @ w) @ basis[:n_basis]
+        # compute the norm once, from the squared norm given by a single dot product
+        norm_w = np.sqrt(np.dot(w, w))
+        if n_basis >= 2:
+            keep_w = norm_w * noise_tolerance_threshold > 1
+        else:
+            keep_w = norm_w > 1e-2
+        if keep_w:
+            basis[n_basis] = w / norm_w
+            n_basis += 1
+
+    return basis[:n_basis]
+
+
+def launch_svc(X, y, sample_weight=None, kernel='linear', C=1, random_state=None):
     """Fit the classification SVMs according to the given training data.
     Parameters
     ----------
@@ -103,6 +204,8 @@ def launch_svc(X, y, sample_weight=None, kernel='linear', C=1):
         kernel used for SVM.
     C : float,
         SVM hyperparameter C
+    random_state : int, RandomState instance or None,
+        seed of the LIBLINEAR dual coordinate descent shuffling
     Returns
     -------
     SVM_coefficient : array-like, shape (1, n_features)
@@ -112,7 +215,12 @@ def launch_svc(X, y, sample_weight=None, kernel='linear', C=1):
     """
 
     # fit the different SVM/hyperplanes
-    SVM_classifier = SVC(kernel=kernel, C=C)
+    if kernel == 'linear':
+        # LIBLINEAR solves the linear problem without building the (n_samples, n_samples) kernel matrix
+        # the hinge loss dual converges slowly with small C, hence the large iterations budget
+        SVM_classifier = LinearSVC(C=C, loss='hinge', dual=True, max_iter=10000, random_state=random_state)
+    else:
+        SVM_classifier = SVC(kernel=kernel, C=C, random_state=random_state)
     SVM_classifier.fit(X, y, sample_weight=sample_weight)
 
     # get SVM intercept value